@@ -8,12 +8,17 @@ Claude Code CLI 会话的状态检测。
 
 from __future__ import annotations
 
+import asyncio
+import functools
 import json
 import re
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .ansi import strip_ansi
 
 
 # ---------------------------------------------------------------------------
@@ -23,11 +28,12 @@ from typing import Any, Dict, List, Optional, Tuple
 # Claude Code CLI 处理过程中使用的旋转字符
 SPINNER_CHARS = frozenset("·✢✳✶✻✽")
 
-# 匹配行首旋转字符的正则表达式（允许前导空白）
-_SPINNER_RE = re.compile(r"^\s*([·✢✳✶✻✽])\s+(.*)", re.MULTILINE)
+# 状态指示字符（❯、?、旋转字符）。交互式提示均含 ?，因此不含这些字符的
+# 输出可直接判定为 idle，不含这些字符的行也无需逐项检查
+_INDICATOR_RE = re.compile("[❯?" + "".join(sorted(SPINNER_CHARS)) + "]")
 
-# 分隔线字符集（用于检测 ────────── 或 ╌╌╌╌╌╌╌╌╌╌ 等分隔线）
-_SEPARATOR_CHARS = frozenset("─━╌╍═")
+# 分隔线（用于检测 ────────── 或 ╌╌╌╌╌╌╌╌╌╌ 等至少 4 个字符的分隔线）
+_SEPARATOR_RE = re.compile(r"[─━╌╍═]{4,}\Z")
 
 # 任务完成时显示的词语
 COMPLETED_WORDS = frozenset({
@@ -35,6 +41,9 @@ COMPLETED_WORDS = frozenset({
     "Cooked", "Crunched", "Sautéed", "Worked",
 })
 
+# 完成词的首字母集合，用于在哈希查找前快速排除
+_COMPLETED_FIRST_CHARS = frozenset(w[0] for w in COMPLETED_WORDS)
+
 # 表示 Claude 正在等待用户输入的交互式提示
 INTERACTIVE_PROMPTS = (
     "Should I proceed?",
@@ -45,6 +54,18 @@ INTERACTIVE_PROMPTS = (
     "Ready to submit your answers?",
 )
 
+# 提示模式标识：(标识字符, 同一行须包含的关键词（小写）, 模式名)，同一行内按此顺序优先
+_MODE_MARKERS = (
+    ("⏸", "plan", "plan"),
+    ("⏵⏵", "accept", "accept-edits"),
+)
+
+# 所有交互式提示合并为单个交替正则，一次扫描代替逐个子串检查；
+# 按长度降序排列，同一位置起始的提示总是匹配最长的完整提示
+_PROMPT_RE = re.compile(
+    "|".join(map(re.escape, sorted(INTERACTIVE_PROMPTS, key=len, reverse=True)))
+)
+
 # Claude Code CLI 所有处理中的状态词
 PROCESSING_WORDS = frozenset({
     "Accomplishing", "Actioning", "Actualizing", "Adding", "Architecting",
@@ -94,7 +115,7 @@ PROCESSING_WORDS = frozenset({
 
 def _is_separator_line(stripped: str) -> bool:
     """判断是否为分隔线（如 ────────── 或 ╌╌╌╌╌╌╌╌╌╌）。"""
-    return len(stripped) >= 4 and all(c in _SEPARATOR_CHARS for c in stripped)
+    return _SEPARATOR_RE.match(stripped) is not None
 
 
 def _nearest_non_empty(lines: list, idx: int, direction: int, max_dist: int = 3) -> Optional[int]:
@@ -122,6 +143,12 @@ def _nearest_non_empty(lines: list, idx: int, direction: int, max_dist: int = 3)
 # 核心检测函数
 # ---------------------------------------------------------------------------
 
+# 检测结果缓存的条目数：调用方通常反复轮询同一屏幕，
+# 缓存需能容纳多个会话各自的当前屏幕
+_DETECTION_CACHE_SIZE = 64
+
+
+@functools.lru_cache(maxsize=_DETECTION_CACHE_SIZE)
 def detect_claude_state(output: str) -> Tuple[str, str]:
     """从渲染后的终端输出中检测 Claude Code CLI 的交互状态。
 
@@ -133,6 +160,8 @@ def detect_claude_state(output: str) -> Tuple[str, str]:
     2. 否则向上搜索 ?，以分隔线为自然边界 → interactive
     3. 无 ? → 跳过此 ❯ 继续扫描
 
+    结果按输出内容缓存，反复检测同一屏幕时直接返回上次结果。
+
     返回:
         (state, detail)，其中 state 为以下之一：
         - "inputting": 用户正在输入
@@ -144,22 +173,28 @@ def detect_claude_state(output: str) -> Tuple[str, str]:
     if not output:
         return ("idle", "")
 
+    # 快速排除：不含任何状态指示字符时无需逐行扫描
+    if not _INDICATOR_RE.search(output):
+        return ("idle", "")
+
     lines = output.split("\n")
 
     for i in range(len(lines) - 1, -1, -1):
         line = lines[i]
-        stripped = line.strip()
-        if not stripped:
+        # 一次 C 层扫描排除空行和不含任何指示字符的普通文本行，
+        # 只有候选行才需要 strip
+        if not _INDICATOR_RE.search(line):
             continue
+        stripped = line.strip()
 
         # A. 检查已知交互式提示（INTERACTIVE_PROMPTS 本身已含 ?）
-        for prompt in INTERACTIVE_PROMPTS:
-            if prompt in stripped:
-                return ("interactive", prompt)
+        m = _PROMPT_RE.search(stripped)
+        if m:
+            return ("interactive", m.group(0))
 
         # B. 检查 ❯ 提示符
         if "❯" in stripped:
-            after = stripped.split("❯", 1)[1].strip()
+            after = stripped.partition("❯")[2].strip()
             if after:
                 # B1. 检查 ❯ 是否被分隔线包围 → inputting（用户正在输入）
                 # 真实 Claude Code CLI 输入布局：
@@ -188,7 +223,7 @@ def detect_claude_state(output: str) -> Tuple[str, str]:
                         continue  # 跳过空行
                     if _is_separator_line(above_stripped):
                         break  # 到达分隔线边界，停止搜索
-                    if "?" in lines[above_idx]:
+                    if "?" in above_stripped:
                         has_question = True
                         break
                 if has_question:
@@ -201,46 +236,51 @@ def detect_claude_state(output: str) -> Tuple[str, str]:
                 # 空 ❯ 出现在 spinner 行下方，需继续向上扫描
                 continue
 
-        # C. 检查旋转字符（spinner）
-        m = _SPINNER_RE.match(line)
-        if m:
-            rest = m.group(2).strip()
-            if not rest:
-                continue
-            first_word = rest.split()[0] if rest.split() else ""
+        # C. 检查旋转字符（spinner）：行首为旋转字符且其后紧跟空白
+        if stripped[0] in SPINNER_CHARS and stripped[1:2].isspace():
+            # stripped 以非空白结尾，故 rest 非空，至少有一个词
+            rest = stripped[1:].strip()
+            first_word = rest.split(None, 1)[0]
             # 已完成状态：spinner 后跟完成词
-            if first_word in COMPLETED_WORDS:
+            if first_word[0] in _COMPLETED_FIRST_CHARS and first_word in COMPLETED_WORDS:
                 return ("completed", first_word)
-            # 处理中状态：已知词语或系统状态消息
-            if first_word in PROCESSING_WORDS:
-                return ("processing", rest)
-            if rest.endswith("…") or rest.endswith("..."):
-                return ("processing", rest)
-            # 旋转字符后跟未知文本——仍可能是处理中
+            # 其余均为处理中：已知处理词（PROCESSING_WORDS）、以 … 结尾的
+            # 系统状态消息，或旋转字符后跟未知文本
             return ("processing", rest)
 
     return ("idle", "")
 
 
+@functools.lru_cache(maxsize=_DETECTION_CACHE_SIZE)
 def detect_claude_mode(output: str) -> str:
     """从渲染后的终端输出中检测 Claude Code CLI 的提示模式。
 
+    在整个屏幕文本中用 str.find 定位模式标识，不切分行；
+    多个标识同时出现时，位置最靠上的一行优先（同一行内 plan 优先）。
+    结果按输出内容缓存。
+
     返回:
         "plan"、"accept-edits" 或 "default"
     """
     if not output:
         return "default"
 
-    lines = output.split("\n")
+    best: Optional[Tuple[int, int, str]] = None
+    for priority, (marker, keyword, mode) in enumerate(_MODE_MARKERS):
+        idx = output.find(marker)
+        while idx != -1:
+            start = output.rfind("\n", 0, idx) + 1
+            end = output.find("\n", idx)
+            if end == -1:
+                end = len(output)
+            # 只对含标识的行做小写转换
+            if keyword in output[start:end].lower():
+                if best is None or (start, priority) < best[:2]:
+                    best = (start, priority, mode)
+                break
+            idx = output.find(marker, end)
 
-    # 扫描所有行以查找模式指示符
-    for line in lines:
-        if "⏸" in line and "plan" in line.lower():
-            return "plan"
-        if "⏵⏵" in line and "accept" in line.lower():
-            return "accept-edits"
-
-    return "default"
+    return best[2] if best else "default"
 
 
 # ---------------------------------------------------------------------------
@@ -288,7 +328,7 @@ class InteractionType(Enum):
 # 状态检测数据类
 # ---------------------------------------------------------------------------
 
-@dataclass
+@dataclass(slots=True)
 class TimingInfo:
     """
     任务执行的计时信息。
@@ -309,7 +349,7 @@ class TimingInfo:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class StatusDetail:
     """
     当前状态的详细信息。
@@ -329,7 +369,7 @@ class StatusDetail:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class StatusResponse:
     """
     get_status 返回的结构化响应。
@@ -368,7 +408,7 @@ class StatusResponse:
         return json.dumps(self.to_dict(), indent=2)
 
 
-@dataclass
+@dataclass(slots=True)
 class InteractionMatch:
     """
     交互模式匹配的结果。
@@ -380,7 +420,7 @@ class InteractionMatch:
     matched_text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class InteractionPattern:
     """
     用于检测交互式提示的正则模式。
@@ -392,7 +432,7 @@ class InteractionPattern:
     priority: int
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionState:
     """
     跟踪被监控会话的状态。
@@ -476,6 +516,8 @@ class SessionState:
 
 # 轮询间隔
 POLLING_INTERVAL_SECONDS = 1.0
+# poll_all 同时进行中的 stream 请求上限，避免大量会话同时挤占同一连接
+MAX_CONCURRENT_POLLS = 64
 INTERACTIVE_STABILITY_THRESHOLD = 2
 COMPLETED_STABILITY_THRESHOLD = 5
 
@@ -494,6 +536,17 @@ MAX_AUTO_RESPONSES_PER_STEP = 20
 # PyteRenderer — ANSI 输出渲染
 # ---------------------------------------------------------------------------
 
+# 渲染结果中需移除的不可见 Unicode 字符
+_INVISIBLE_TRANSLATE = str.maketrans({c: None for c in (
+    '\u200b',  # 零宽空格
+    '\u200c',  # 零宽非连接符
+    '\u200d',  # 零宽连接符
+    '\u200e',  # 从左到右标记
+    '\u200f',  # 从右到左标记
+    '\ufeff',  # 零宽不换行空格（BOM）
+)})
+
+
 class PyteRenderer:
     """
     使用 pyte 将原始 ANSI 输出渲染为干净的屏幕文本。
@@ -502,6 +555,9 @@ class PyteRenderer:
     本类使用可配置的终端尺寸处理本地 pyte 渲染。
     它维护一个 pyte Screen 和 Stream 来处理 ANSI 转义序列
     并提取干净的文本输出。
+
+    会话输出只会不断追加，因此渲染器记住已送入 pyte 的输出：
+    新输出以其为前缀时只送入增量部分，否则重置屏幕后完整重放。
     """
 
     def __init__(self, cols: int = PYTE_TERMINAL_COLS, rows: int = PYTE_TERMINAL_ROWS):
@@ -516,7 +572,11 @@ class PyteRenderer:
         self._rows = rows
         self._screen: Optional[Any] = None  # pyte.Screen
         self._stream: Optional[Any] = None  # pyte.Stream or pyte.ByteStream
-        self._initialize_pyte()
+        self._feed: Optional[Callable[[Any], None]] = None
+        # 当前屏幕内容对应的已送入输出（None 表示屏幕需重置）
+        self._fed_output: Optional[str] = None
+        # pyte 在首次渲染时才初始化
+        self._pyte_initialized = False
 
     def _initialize_pyte(self) -> None:
         """
@@ -525,6 +585,7 @@ class PyteRenderer:
         尝试导入 pyte 并创建 Screen 和 Stream 实例。
         同时处理 ByteStream（较新 pyte 版本）和普通 Stream。
         """
+        self._pyte_initialized = True
         try:
             import pyte
 
@@ -533,24 +594,33 @@ class PyteRenderer:
 
             # 优先尝试使用 ByteStream（较新的 pyte 版本）
             # 如不可用，回退到普通 Stream
+            # 在此一次性确定送入方式，避免每次渲染都判断流类型
             try:
                 self._stream = pyte.ByteStream(self._screen)
+                self._feed = self._feed_bytes
             except AttributeError:
                 # 较旧的 pyte 版本只有 Stream
                 self._stream = pyte.Stream(self._screen)
+                self._feed = self._stream.feed
 
         except ImportError:
             # pyte 不可用，将使用正则回退
             self._screen = None
             self._stream = None
+            self._feed = None
 
+    def _feed_bytes(self, data: Any) -> None:
+        """将输出送入 ByteStream，字符串先编码为 UTF-8。"""
+        if isinstance(data, str):
+            data = data.encode('utf-8', errors='replace')
+        self._stream.feed(data)
 
     def render(self, raw_output: str) -> str:
         """
         将原始 ANSI 输出渲染为干净文本。
 
-        优先尝试使用 pyte 渲染。如果 pyte 不可用或
-        渲染失败，回退到基于正则的 ANSI 剥离。
+        首先尝试使用 pyte 渲染。
+        如果 pyte 不可用或渲染失败，回退到基于正则的 ANSI 剥离。
 
         参数:
             raw_output: 包含 ANSI 转义序列的终端输出
@@ -577,24 +647,29 @@ class PyteRenderer:
         异常:
             Exception: 当 pyte 不可用或渲染失败时
         """
+        if not self._pyte_initialized:
+            self._initialize_pyte()
         if self._screen is None or self._stream is None:
             raise RuntimeError("pyte not available")
 
-        # 重置屏幕以进行新的渲染
-        self._screen.reset()
-
-        # 将输出送入 pyte 流
-        # 处理字符串和字节输入
-        if isinstance(raw_output, str):
-            # 对于 ByteStream，编码为字节
-            if hasattr(self._stream, 'feed') and 'Byte' in type(self._stream).__name__:
-                self._stream.feed(raw_output.encode('utf-8', errors='replace'))
-            else:
-                # 对于普通 Stream，直接送入字符串
-                self._stream.feed(raw_output)
+        fed = self._fed_output
+        if (fed is not None and type(raw_output) is type(fed)
+                and raw_output.startswith(fed)):
+            # 输出在上次基础上追加——只送入新增部分
+            delta = raw_output[len(fed):]
         else:
-            # 已经是字节
-            self._stream.feed(raw_output)
+            # 输出被替换或截断——重置屏幕以进行新的渲染
+            self._screen.reset()
+            delta = raw_output
+
+        # 送入过程中失败时屏幕状态不可信，下次需完整重放
+        self._fed_output = None
+
+        # 将输出送入 pyte 流（送入方式已在初始化时确定）；
+        # 只有增量部分需要编码，输出未变化时无需送入
+        if delta:
+            self._feed(delta)
+        self._fed_output = raw_output
 
         # 从屏幕缓冲区提取并清理文本
         return self._extract_screen_text()
@@ -611,8 +686,6 @@ class PyteRenderer:
         返回:
             移除了 ANSI 码的文本
         """
-        from terminalcp.ansi import strip_ansi
-
         # 剥离 ANSI 码
         clean_text = strip_ansi(raw_output)
 
@@ -623,8 +696,7 @@ class PyteRenderer:
         """
         从 pyte 屏幕缓冲区提取文本。
 
-        遍历屏幕显示缓冲区并提取文本行，
-        然后进行清理以移除尾部空白和不可见 Unicode 字符。
+        逐行移除尾部空白和不可见 Unicode 字符后合并。
 
         返回:
             从屏幕缓冲区提取的干净文本
@@ -632,16 +704,11 @@ class PyteRenderer:
         if self._screen is None:
             return ""
 
-        # 从屏幕显示缓冲区提取行
-        lines = []
-        for row in range(self._rows):
-            # 从屏幕显示获取行
-            line = self._screen.display[row]
-            lines.append(line)
-
-        # 合并行并清理
-        text = '\n'.join(lines)
-        return self._clean_text(text)
+        # display 已是每行一个字符串的列表，逐行清理后只合并一次，
+        # 避免先合并再由 _clean_text 重新拆分
+        return '\n'.join(
+            line.rstrip().translate(_INVISIBLE_TRANSLATE) for line in self._screen.display
+        )
 
     def _clean_text(self, text: str) -> str:
         """
@@ -656,28 +723,9 @@ class PyteRenderer:
         返回:
             移除了尾部空白和不可见字符的干净文本
         """
-        # 从每行剥离尾部空白
-        lines = text.split('\n')
-        lines = [line.rstrip() for line in lines]
-
-        # 移除不可见 Unicode 字符
-        # 零宽空格、零宽连接符、零宽非连接符等
-        invisible_chars = [
-            '\u200b',  # 零宽空格
-            '\u200c',  # 零宽非连接符
-            '\u200d',  # 零宽连接符
-            '\u200e',  # 从左到右标记
-            '\u200f',  # 从右到左标记
-            '\ufeff',  # 零宽不换行空格（BOM）
-        ]
-
-        cleaned_lines = []
-        for line in lines:
-            for char in invisible_chars:
-                line = line.replace(char, '')
-            cleaned_lines.append(line)
-
-        return '\n'.join(cleaned_lines)
+        return '\n'.join(
+            line.rstrip().translate(_INVISIBLE_TRANSLATE) for line in text.split('\n')
+        )
 
 
 # ---------------------------------------------------------------------------
@@ -708,11 +756,15 @@ class StatusDetector:
         # 每个会话的缓存渲染输出（用于前端显示）
         self._live_outputs: Dict[str, str] = {}
 
-        # 每个会话的 pyte 渲染器
-        self._pyte_renderers: Dict[str, PyteRenderer] = {}
+        # 每个会话的 pyte 渲染器（保留屏幕状态以便增量送入输出，首次访问时创建）
+        self._pyte_renderers: Dict[str, PyteRenderer] = defaultdict(PyteRenderer)
+
+        # 每个会话上次原始输出的 (长度, 哈希)，用于跳过未变化输出的渲染
+        self._raw_keys: Dict[str, Tuple[int, int]] = {}
 
         # 配置常量
         self._polling_interval = POLLING_INTERVAL_SECONDS
+        self._max_concurrent_polls = MAX_CONCURRENT_POLLS
         self._interactive_threshold = INTERACTIVE_STABILITY_THRESHOLD
         self._completed_threshold = COMPLETED_STABILITY_THRESHOLD
 
@@ -723,7 +775,7 @@ class StatusDetector:
         根据输出变化和模式匹配更新状态。
         本方法：
         1. 调用 stream 操作并设置 strip_ansi=false 获取原始 ANSI 输出
-        2. 使用 pyte 渲染输出
+        2. 使用 pyte 渲染输出（原始输出未变化时跳过渲染）
         3. 与之前的输出比较以更新 stable_count
         4. 缓存渲染后的输出
 
@@ -738,11 +790,6 @@ class StatusDetector:
         if not state:
             raise RuntimeError(f"Session not found: {session_id}")
 
-        # 获取此会话的 pyte 渲染器（如需要则创建）
-        if session_id not in self._pyte_renderers:
-            self._pyte_renderers[session_id] = PyteRenderer()
-        renderer = self._pyte_renderers[session_id]
-
         # 调用 stream 操作并设置 strip_ansi=false 以获取原始 ANSI 输出
         try:
             raw_output = await self._client.request({
@@ -753,8 +800,17 @@ class StatusDetector:
         except Exception as e:
             raise RuntimeError(f"Failed to get stream output for session {session_id}: {e}")
 
-        # 使用 pyte 渲染输出
-        rendered_output = renderer.render(raw_output)
+        # 原始输出与上次完全相同——跳过 pyte 渲染，沿用上次的渲染结果
+        # 以 (长度, 哈希) 作为键，进一步降低误判为未变化的概率
+        raw_key = (len(raw_output), hash(raw_output))
+        if raw_key == self._raw_keys.get(session_id):
+            state.stable_count += 1
+            return
+        self._raw_keys[session_id] = raw_key
+
+        # 使用此会话的 pyte 渲染器（defaultdict 按需创建）渲染输出，
+        # 只送入自上次渲染以来新增的部分
+        rendered_output = self._pyte_renderers[session_id].render(raw_output)
 
         # 与之前的输出比较以更新 stable_count
         previous_output = state.last_output
@@ -770,3 +826,31 @@ class StatusDetector:
 
         # 将渲染输出缓存到 _live_outputs 供前端访问
         self._live_outputs[session_id] = rendered_output
+
+    async def poll_all(self) -> Dict[str, BaseException]:
+        """
+        并发执行所有已跟踪会话的一次轮询周期。
+
+        各会话的 stream 请求彼此重叠，总耗时约为一次往返而非 N 次；
+        同时进行中的请求数不超过 MAX_CONCURRENT_POLLS。
+        单个会话失败不影响其他会话。
+
+        返回:
+            轮询失败的会话 ID 到对应异常的映射（全部成功时为空字典）
+        """
+        session_ids = list(self._session_states)
+        semaphore = asyncio.Semaphore(self._max_concurrent_polls)
+
+        async def poll(session_id: str) -> None:
+            async with semaphore:
+                await self._poll_session(session_id)
+
+        results = await asyncio.gather(
+            *(poll(session_id) for session_id in session_ids),
+            return_exceptions=True,
+        )
+        return {
+            session_id: result
+            for session_id, result in zip(session_ids, results)
+            if isinstance(result, BaseException)
+        }
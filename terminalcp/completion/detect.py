@@ -1,22 +1,25 @@
 """Shell 类型检测逻辑。"""
 from __future__ import annotations
 
+import functools
 import os
-from pathlib import Path
 from typing import Optional
 
 
 _SUPPORTED_SHELLS = {"bash", "zsh", "fish"}
 
 
+@functools.lru_cache(maxsize=1)
 def detect_shell() -> str:
     """检测当前用户的 Shell。
 
     策略（按可靠性排序）：
     1. ``$SHELL`` 环境变量（用户配置的登录 Shell）
-    2. 通过 ``ps`` 获取父进程名称
+    2. 通过 ``/proc`` 或 ``ps`` 获取父进程名称
     3. 默认为 ``bash``
 
+    进程内 Shell 不会改变，结果在首次调用后缓存。
+
     返回以下之一：``"bash"``、``"zsh"``、``"fish"``
     """
     shell_env = os.environ.get("SHELL", "")
@@ -35,18 +38,28 @@ def _extract_shell_name(shell_path: str) -> Optional[str]:
     """从类似 ``/bin/zsh`` 的路径中提取已识别的 Shell 名称。"""
     if not shell_path:
         return None
-    basename = Path(shell_path).name.lstrip("-")
+    basename = os.path.basename(shell_path).lstrip("-")
     if basename in _SUPPORTED_SHELLS:
         return basename
     return None
 
 
 def _detect_from_parent_process() -> Optional[str]:
-    """尝试从父进程检测 Shell 类型（macOS / Linux）。"""
+    """尝试从父进程检测 Shell 类型（macOS / Linux）。
+
+    Linux 上直接读取 ``/proc/<ppid>/comm``，无需派生子进程；
+    其他平台回退到 ``ps``。
+    """
+    ppid = os.getppid()
+    try:
+        with open(f"/proc/{ppid}/comm", "r") as f:
+            return _extract_shell_name(f.read().strip())
+    except OSError:
+        pass
+
     try:
         import subprocess
 
-        ppid = os.getppid()
         result = subprocess.run(
             ["ps", "-p", str(ppid), "-o", "comm="],
             capture_output=True,
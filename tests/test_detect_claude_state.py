@@ -121,13 +121,13 @@ class TestInteractivePromptsState:
         assert state == "interactive"
         assert detail == "Should I proceed?"
 
-    def test_all_interactive_prompts_detectable(self):
+    @pytest.mark.parametrize("prompt", INTERACTIVE_PROMPTS)
+    def test_all_interactive_prompts_detectable(self, prompt):
         """验证所有 INTERACTIVE_PROMPTS 都能被检测到。"""
-        for prompt in INTERACTIVE_PROMPTS:
-            output = f"Some context\n{prompt}"
-            state, detail = detect_claude_state(output)
-            assert state == "interactive", f"Failed for prompt: {prompt}"
-            assert detail == prompt, f"Wrong detail for prompt: {prompt}"
+        output = f"Some context\n{prompt}"
+        state, detail = detect_claude_state(output)
+        assert state == "interactive"
+        assert detail == prompt
 
 
 class TestInteractiveArrowDualCondition:
@@ -441,12 +441,12 @@ class TestProcessingState:
         assert state == "processing"
         assert detail == "Writing"
 
-    def test_all_spinner_chars_work(self):
+    @pytest.mark.parametrize("char", sorted(SPINNER_CHARS))
+    def test_all_spinner_chars_work(self, char):
         """验证所有 SPINNER_CHARS 都能触发检测。"""
-        for char in SPINNER_CHARS:
-            output = f"{char} Processing"
-            state, detail = detect_claude_state(output)
-            assert state == "processing", f"Failed for spinner char: {char}"
+        output = f"{char} Processing"
+        state, detail = detect_claude_state(output)
+        assert state == "processing"
 
     def test_spinner_with_leading_whitespace(self):
         """spinner 前有空白 → 正常匹配。"""
@@ -455,14 +455,25 @@ class TestProcessingState:
         assert state == "processing"
         assert detail == "Thinking"
 
-    def test_some_processing_words(self):
+    @pytest.mark.parametrize("word", ["Thinking", "Writing", "Processing", "Cooking", "Computing"])
+    def test_some_processing_words(self, word):
         """测试多个常见的 PROCESSING_WORDS。"""
-        words = ["Thinking", "Writing", "Processing", "Cooking", "Computing"]
-        for word in words:
-            output = f"✻ {word}"
-            state, detail = detect_claude_state(output)
-            assert state == "processing", f"Failed for word: {word}"
-            assert word in detail
+        output = f"✻ {word}"
+        state, detail = detect_claude_state(output)
+        assert state == "processing"
+        assert word in detail
+
+    def test_spinner_glued_to_text_not_matched(self):
+        """spinner 后无空白直接接文字 → 不是 spinner 行。"""
+        assert detect_claude_state("✻Thinking") == ("idle", "")
+
+    def test_spinner_followed_by_tab(self):
+        """spinner 后为制表符 → 正常匹配，首词按任意空白切分。"""
+        assert detect_claude_state("✻\tCogitated\tfor 3s") == ("completed", "Cogitated")
+
+    def test_spinner_trailing_spaces_only_skipped(self):
+        """spinner 后只有空白 → 跳过此行继续向上扫描。"""
+        assert detect_claude_state("✢ Brewing\n✻    ") == ("processing", "Brewing")
 
 
 class TestCompletedState:
@@ -475,13 +486,13 @@ class TestCompletedState:
         assert state == "completed"
         assert detail == "Worked"
 
-    def test_all_completed_words(self):
+    @pytest.mark.parametrize("word", sorted(COMPLETED_WORDS))
+    def test_all_completed_words(self, word):
         """验证所有 COMPLETED_WORDS 都能被检测到。"""
-        for word in COMPLETED_WORDS:
-            output = f"✻ {word}"
-            state, detail = detect_claude_state(output)
-            assert state == "completed", f"Failed for completed word: {word}"
-            assert detail == word
+        output = f"✻ {word}"
+        state, detail = detect_claude_state(output)
+        assert state == "completed"
+        assert detail == word
 
     def test_completed_word_case_sensitive(self):
         """completed word 大小写不匹配 → 不返回 completed。"""
@@ -562,6 +573,26 @@ class TestPriorityAndCoexistence:
         assert state == "interactive"
         assert detail == "Should I proceed?"
 
+    def test_trailing_blank_rows_ignored(self):
+        """渲染屏幕底部的大量空行不影响底部状态检测。"""
+        output = "Header\n✻ Thinking" + "\n" * 60
+        assert detect_claude_state(output) == ("processing", "Thinking")
+
+    def test_spinner_above_long_todo_list_detected(self):
+        """spinner 与底部空 ❯ 之间隔着很长的待办列表 → 仍扫描整个屏幕。"""
+        sep = "─" * 40
+        lines = ["✻ Thinking…"] + [f"  ☐ Todo item {i}" for i in range(30)]
+        lines += [sep, "❯ ", sep]
+        assert detect_claude_state("\n".join(lines)) == ("processing", "Thinking…")
+
+    def test_arrow_option_far_from_bottom_detected(self):
+        """带 ? 的问题在 ❯ 选项上方、选项下方还有很多行 → interactive。"""
+        lines = ["Which approach should we take?"]
+        lines += [f"  Context line {i}" for i in range(5)]
+        lines.append("❯ 1. Yes")
+        lines += [f"  Detail line {i}" for i in range(27)]
+        assert detect_claude_state("\n".join(lines)) == ("interactive", "1. Yes")
+
 
 class TestBareArrowWithSpinner:
     """空 ❯ 与 spinner 共存的场景测试（真实 Claude Code CLI 布局）。
@@ -732,6 +763,46 @@ class TestDetectClaudeMode:
         assert detect_claude_mode("⏵⏵ ACCEPT edits") == "accept-edits"
         assert detect_claude_mode("⏵⏵ Accept Edits") == "accept-edits"
 
+    def test_marker_and_keyword_on_different_lines(self):
+        """标识与关键词不在同一行 → default。"""
+        assert detect_claude_mode("⏸ paused\nplan ahead") == "default"
+        assert detect_claude_mode("accept this\n⏵⏵ edits") == "default"
+
+    def test_both_markers_same_line_plan_wins(self):
+        """同一行同时出现两种标识 → plan 优先。"""
+        assert detect_claude_mode("⏵⏵ accept · ⏸ plan") == "plan"
+
+    def test_mode_line_above_full_width_rows_detected(self):
+        """模式行下方有很多满宽行 → 仍检查整个屏幕。"""
+        output = "  ⏸ plan mode on\n" + "\n".join("x" * 120 for _ in range(49))
+        assert detect_claude_mode(output) == "plan"
+
+    def test_marker_repeated_until_keyword_line(self):
+        """首个标识行无关键词时，继续查找后续同类标识。"""
+        output = "⏸ paused\nSome output\n⏸ plan mode on"
+        assert detect_claude_mode(output) == "plan"
+
+
+class TestDetectionCache:
+    """测试检测结果按输出内容缓存。"""
+
+    def test_state_repeated_screen_hits_cache(self):
+        """测试内容相同的屏幕（即使是不同对象）命中缓存且结果一致。"""
+        screen = "".join(["✻ Brewing", "…\n", "❯"])
+        first = detect_claude_state(screen)
+        hits = detect_claude_state.cache_info().hits
+        same_content = "".join(["✻ Brewing…", "\n❯"])
+        assert detect_claude_state(same_content) == first == ("processing", "Brewing…")
+        assert detect_claude_state.cache_info().hits == hits + 1
+
+    def test_mode_repeated_screen_hits_cache(self):
+        """测试模式检测同样命中缓存。"""
+        screen = "output\n  ⏸ plan mode on (cached)"
+        assert detect_claude_mode(screen) == "plan"
+        hits = detect_claude_mode.cache_info().hits
+        assert detect_claude_mode(screen) == "plan"
+        assert detect_claude_mode.cache_info().hits == hits + 1
+
 
 # =========================================================================
 # C. 真实 CLI 场景集成测试（来自 test_state_simulator.py）
@@ -4,6 +4,7 @@ StatusDetector._poll_session 方法的测试。
 测试输出轮询和稳定性跟踪功能。
 """
 
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from terminalcp.claude_status import (
@@ -140,6 +141,24 @@ class TestPollSession:
         # 验证渲染器已创建
         assert session_id in detector._pyte_renderers
     
+    @pytest.mark.asyncio
+    async def test_poll_session_keeps_separate_renderer_per_session(self):
+        """测试每个会话使用独立的 PyteRenderer，屏幕状态互不影响。"""
+        mock_client = MagicMock()
+        mock_client.request = AsyncMock(side_effect=["\x1b[Houtput A", "\x1b[Houtput B"])
+
+        detector = StatusDetector(mock_client)
+        for session_id in ("test-session-6a", "test-session-6b"):
+            detector._session_states[session_id] = SessionState(session_id=session_id)
+
+        await detector._poll_session("test-session-6a")
+        await detector._poll_session("test-session-6b")
+
+        renderers = detector._pyte_renderers
+        assert renderers["test-session-6a"] is not renderers["test-session-6b"]
+        assert detector._live_outputs["test-session-6a"].startswith("output A")
+        assert detector._live_outputs["test-session-6b"].startswith("output B")
+    
     @pytest.mark.asyncio
     async def test_poll_session_raises_error_for_nonexistent_session(self):
         """测试 _poll_session 对不存在的会话抛出 RuntimeError。"""
@@ -171,6 +190,29 @@ class TestPollSession:
         with pytest.raises(RuntimeError, match="Failed to get stream output"):
             await detector._poll_session(session_id)
     
+    @pytest.mark.asyncio
+    async def test_poll_session_skips_render_for_unchanged_raw_output(self, monkeypatch):
+        """测试原始输出未变化时跳过 pyte 渲染。"""
+        mock_client = MagicMock()
+        mock_client.request = AsyncMock(return_value="\x1b[32msame\x1b[0m output")
+
+        detector = StatusDetector(mock_client)
+        session_id = "test-session-skip"
+        detector._session_states[session_id] = SessionState(session_id=session_id)
+
+        # 首次轮询正常渲染
+        await detector._poll_session(session_id)
+        first_output = detector._session_states[session_id].last_output
+
+        # 第二次轮询不应再调用渲染器
+        renderer = detector._pyte_renderers[session_id]
+        monkeypatch.setattr(renderer, "render", MagicMock(side_effect=AssertionError("render called")))
+        await detector._poll_session(session_id)
+
+        assert detector._session_states[session_id].stable_count == 1
+        assert detector._session_states[session_id].last_output == first_output
+        assert detector._live_outputs[session_id] == first_output
+
     @pytest.mark.asyncio
     async def test_poll_session_multiple_cycles_with_changes(self):
         """测试带输出变化的多次轮询周期。"""
@@ -230,3 +272,78 @@ class TestPollSession:
         rendered = detector._live_outputs[session_id]
         assert "\x1b" not in rendered  # No ANSI escape sequences
         assert "Green" in rendered or "Bold" in rendered  # Text content preserved
+
+
+class TestPollAll:
+    """测试 poll_all 方法。"""
+
+    @pytest.mark.asyncio
+    async def test_poll_all_polls_every_session(self):
+        """测试 poll_all 轮询所有已跟踪的会话。"""
+        mock_client = MagicMock()
+        mock_client.request = AsyncMock(return_value="shared output")
+
+        detector = StatusDetector(mock_client)
+        for session_id in ("poll-all-1", "poll-all-2", "poll-all-3"):
+            detector._session_states[session_id] = SessionState(session_id=session_id)
+
+        errors = await detector.poll_all()
+
+        assert errors == {}
+        assert mock_client.request.await_count == 3
+        assert set(detector._live_outputs) == {"poll-all-1", "poll-all-2", "poll-all-3"}
+
+    @pytest.mark.asyncio
+    async def test_poll_all_isolates_failures(self):
+        """测试单个会话失败不影响其他会话，并在结果中返回异常。"""
+        async def fake_request(args):
+            if args["id"] == "poll-all-bad":
+                raise Exception("Stream failed")
+            return "good output"
+
+        mock_client = MagicMock()
+        mock_client.request = AsyncMock(side_effect=fake_request)
+
+        detector = StatusDetector(mock_client)
+        for session_id in ("poll-all-good", "poll-all-bad"):
+            detector._session_states[session_id] = SessionState(session_id=session_id)
+
+        errors = await detector.poll_all()
+
+        assert set(errors) == {"poll-all-bad"}
+        assert isinstance(errors["poll-all-bad"], RuntimeError)
+        assert detector._live_outputs["poll-all-good"].startswith("good output")
+
+    @pytest.mark.asyncio
+    async def test_poll_all_bounds_concurrency(self):
+        """测试 poll_all 同时进行中的请求数不超过上限。"""
+        in_flight = 0
+        peak = 0
+
+        async def fake_request(args):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return f"output {args['id']}"
+
+        mock_client = MagicMock()
+        mock_client.request = AsyncMock(side_effect=fake_request)
+        detector = StatusDetector(mock_client)
+        detector._max_concurrent_polls = 2
+        for i in range(5):
+            session_id = f"poll-all-bounded-{i}"
+            detector._session_states[session_id] = SessionState(session_id=session_id)
+
+        errors = await detector.poll_all()
+
+        assert errors == {}
+        assert mock_client.request.await_count == 5
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_poll_all_without_sessions(self):
+        """测试没有会话时 poll_all 直接返回。"""
+        detector = StatusDetector(MagicMock())
+        assert await detector.poll_all() == {}
@@ -21,6 +21,7 @@ PyteRenderer 的单元测试。
 """
 
 import pytest
+from unittest.mock import MagicMock
 from terminalcp.claude_status import PyteRenderer
 
 
@@ -135,6 +136,80 @@ class TestPyteRendererANSIProcessing:
         assert "Line 2" in result
         assert "Line 3" in result
 
+    def test_render_sgr_only_keeps_visible_rows(self):
+        """测试只含颜色码的输出只保留屏幕可见行。"""
+        renderer = PyteRenderer(cols=80, rows=5)
+        raw = "\r\n".join(f"\x1b[2mLine {i}\x1b[0m" for i in range(10))
+        result = renderer.render(raw)
+        assert result.split('\n') == [f"Line {i}" for i in range(5, 10)]
+
+    def test_render_does_not_leak_terminal_state(self):
+        """测试前一次渲染设置的滚动区域不影响下一次渲染。"""
+        renderer = PyteRenderer(cols=20, rows=5)
+        renderer.render("\x1b[2;3r\x1b[HStale")
+        output = "\x1b[HA\r\nB\r\nC\r\nD"
+        assert renderer.render(output) == PyteRenderer(cols=20, rows=5).render(output)
+
+    def test_render_carriage_return_overwrite(self):
+        """测试单独的回车覆盖同一行（需经 pyte 仿真）。"""
+        renderer = PyteRenderer()
+        result = renderer.render("Loading...\rDone      ")
+        assert "Done" in result
+        assert "Loading" not in result
+
+
+class TestPyteRendererIncremental:
+    """测试追加输出的增量渲染。"""
+
+    def test_appended_output_matches_full_render(self):
+        """测试增量渲染结果与完整重放一致。"""
+        first = "\x1b[2J\x1b[HHeader\r\n\x1b[31m✻ Thinking"
+        second = first + "…\r\n\x1b[0m\x1b[3;1HDone"
+        renderer = PyteRenderer()
+        renderer.render(first)
+        assert renderer.render(second) == PyteRenderer().render(second)
+
+    def test_appended_output_feeds_only_delta(self):
+        """测试追加输出时只送入新增部分。"""
+        renderer = PyteRenderer()
+        first = "\x1b[HLine 1\r\n"
+        renderer.render(first)
+
+        fed = []
+        original_feed = renderer._feed
+        renderer._feed = lambda data: (fed.append(data), original_feed(data))
+        result = renderer.render(first + "\x1b[2;1HLine 2")
+
+        assert fed == ["\x1b[2;1HLine 2"]
+        assert "Line 1" in result
+        assert "Line 2" in result
+
+    def test_pyte_initialized_on_first_use(self):
+        """测试 pyte 在首次渲染时才初始化。"""
+        renderer = PyteRenderer()
+        assert renderer._screen is None
+
+        assert "Moved" in renderer.render("\x1b[HMoved")
+        assert renderer._screen is not None
+
+    def test_unchanged_output_feeds_nothing(self):
+        """测试输出未变化时不再送入 pyte。"""
+        renderer = PyteRenderer()
+        output = "\x1b[HSame text"
+        first = renderer.render(output)
+
+        renderer._feed = MagicMock()
+        assert renderer.render(output) == first
+        renderer._feed.assert_not_called()
+
+    def test_replaced_output_rerenders_from_scratch(self):
+        """测试输出不再以上次内容为前缀时重置屏幕。"""
+        renderer = PyteRenderer()
+        renderer.render("\x1b[HOld content")
+        result = renderer.render("\x1b[HNew")
+        assert "Old" not in result
+        assert "New" in result
+
 
 class TestPyteRendererCleaning:
     """测试文本清理功能。"""
@@ -217,8 +292,8 @@ class TestPyteRendererFallback:
     def test_render_falls_back_on_pyte_failure(self):
         """测试 render() 在 pyte 失败时回退到正则。"""
         renderer = PyteRenderer()
-        # 强制 pyte 不可用
-        original_screen = renderer._screen
+        # 强制 pyte 不可用（标记为已初始化，避免首次渲染时重新创建屏幕）
+        renderer._pyte_initialized = True
         renderer._screen = None
         
         ansi_text = "\x1b[31mText\x1b[0m"
@@ -227,9 +302,7 @@ class TestPyteRendererFallback:
         # 应仍能通过正则回退工作
         assert "Text" in result
         assert "\x1b[" not in result
-        
-        # 恢复
-        renderer._screen = original_screen
+        assert result == renderer._render_with_regex(ansi_text)
 
 
 class TestPyteRendererEdgeCases:
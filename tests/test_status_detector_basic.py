@@ -337,6 +337,7 @@ class TestStatusDetector:
         assert len(detector._live_outputs) == 0
         assert isinstance(detector._pyte_renderers, dict)
         assert len(detector._pyte_renderers) == 0
+        assert detector._raw_keys == {}
         assert detector._polling_interval == 1.0
         assert detector._interactive_threshold == 2
         assert detector._completed_threshold == 5